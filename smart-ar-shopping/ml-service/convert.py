@@ -0,0 +1,64 @@
+# ml-service/convert.py
+"""
+Offline export of the Keras size/fit models to ONNX for the ML service.
+
+Requires tensorflow and tf2onnx, which are not runtime dependencies:
+    pip install tensorflow tf2onnx
+    python convert.py [--quantize]
+
+The service expects this I/O contract from the exported size model:
+    input:  float32 (1, 8) body measurements in cm, ordered as
+            height, shoulder_width, chest_circumference, waist_circumference,
+            hip_circumference, torso_length, arm_length, inseam
+    output: float32 (1, 3) refined chest, waist and hip circumference in cm
+The exported model is checked against these shapes before it is written.
+"""
+import argparse
+
+import tensorflow as tf
+import tf2onnx
+
+SIZE_MODEL_INPUT_SHAPE = (1, 8)
+SIZE_MODEL_OUTPUT_SHAPE = (1, 3)
+
+MODELS = {
+    'models/size_predictor.h5': 'models/size_predictor.onnx',
+    'models/fit_analyzer.h5': 'models/fit_analyzer.onnx',
+}
+
+
+def check_size_model_contract(model):
+    """Verify the size model matches the I/O contract used by the service"""
+    input_shape = tuple(model.input_shape[1:])
+    output_shape = tuple(model.output_shape[1:])
+    if input_shape != SIZE_MODEL_INPUT_SHAPE[1:] or output_shape != SIZE_MODEL_OUTPUT_SHAPE[1:]:
+        raise ValueError(
+            f"Size model must map {SIZE_MODEL_INPUT_SHAPE} -> {SIZE_MODEL_OUTPUT_SHAPE}, "
+            f"got {model.input_shape} -> {model.output_shape}"
+        )
+
+
+def convert_model(keras_path: str, onnx_path: str, quantize: bool = False):
+    """Convert a Keras .h5 model to ONNX, optionally with int8 dynamic quantization"""
+    model = tf.keras.models.load_model(keras_path)
+
+    if keras_path == 'models/size_predictor.h5':
+        check_size_model_contract(model)
+
+    tf2onnx.convert.from_keras(model, output_path=onnx_path)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(onnx_path, onnx_path, weight_type=QuantType.QInt8)
+
+    print(f"Converted {keras_path} -> {onnx_path}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export size/fit models to ONNX')
+    parser.add_argument('--quantize', action='store_true',
+                        help='Apply int8 dynamic quantization to the exported models')
+    args = parser.parse_args()
+
+    for keras_path, onnx_path in MODELS.items():
+        convert_model(keras_path, onnx_path, quantize=args.quantize)
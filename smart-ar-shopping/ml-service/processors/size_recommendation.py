@@ -1,12 +1,92 @@
 # ml-service/processors/size_recommendation.py
 import numpy as np
-import tensorflow as tf
-from scipy.spatial import distance
 import cv2
 from typing import Dict, List, Tuple, Optional
+import heapq
 import json
+import re
+import threading
+from functools import lru_cache
+from types import MappingProxyType
+
+# ONNX models are shared by every engine instance and each is loaded at most
+# once, on first use (see convert.py for exporting the Keras models).
+#
+# Size model contract:
+#   input:  float32 (1, 8), the body measurements in _MODEL_FEATURES order (cm)
+#   output: float32 (1, 3), refined chest, waist and hip circumference (cm)
+# Inference errors or outputs that do not match this fall back to the rule-based system.
+_SIZE_MODEL_PATH = 'models/size_predictor.onnx'
+_FIT_MODEL_PATH = 'models/fit_analyzer.onnx'
+_SESSIONS = {}  # model path -> InferenceSession, or None if it failed to load
+_MODEL_LOCK = threading.Lock()
+
+# Body measurements fed to the size model, in input order
+_MODEL_FEATURES = (
+    'height', 'shoulder_width', 'chest_circumference', 'waist_circumference',
+    'hip_circumference', 'torso_length', 'arm_length', 'inseam'
+)
+
+# Plausible range (cm) for the size model's circumference outputs
+_MODEL_OUTPUT_RANGE_CM = (30.0, 250.0)
+
+# Material keywords recognised in product descriptions (substring matches,
+# so e.g. "stretchy" and "cottonblend" count)
+_MATERIAL_RE = re.compile(
+    r'spandex|elastane|lycra|stretch|cotton|linen|bamboo|polyester|nylon', re.I
+)
+_STRETCH_MATERIALS = frozenset({'spandex', 'elastane', 'lycra', 'stretch'})
+_BREATHABLE_MATERIALS = frozenset({'cotton', 'linen', 'bamboo'})
+_SYNTHETIC_MATERIALS = frozenset({'polyester', 'nylon'})
+
+# Properties assumed when a product lists no materials (read-only, shared)
+_DEFAULT_MATERIAL_PROPERTIES = MappingProxyType({
+    'stretch_factor': 0,
+    'breathability': 0.5,
+    'thickness': 0.5,
+    'drape': 0.5
+})
+
+# Fit tolerance (cm) per product type
+_TOLERANCES = {
+    'shirt': {'chest': 5, 'waist': 8, 'length': 3},
+    'pants': {'waist': 3, 'hip': 5, 'inseam': 2},
+    'dress': {'chest': 4, 'waist': 6, 'hip': 6},
+    'jacket': {'chest': 6, 'shoulder': 2, 'length': 4},
+    'default': {'chest': 5, 'waist': 5, 'hip': 5}
+}
+
+
+def _get_session(path: str):
+    """Load an ONNX model once and share it; None if it cannot be loaded"""
+    if path not in _SESSIONS:
+        with _MODEL_LOCK:
+            if path not in _SESSIONS:
+                try:
+                    import onnxruntime as ort
+                    _SESSIONS[path] = ort.InferenceSession(path, providers=['CPUExecutionProvider'])
+                except Exception as e:
+                    print(f"Model {path} not available ({e}), using rule-based system")
+                    _SESSIONS[path] = None
+    return _SESSIONS[path]
+
+
+@lru_cache(maxsize=16)
+def _tol_vec(product_type: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Chest/waist/hip tolerance and score weight vectors for a product type"""
+    tol = _TOLERANCES.get(product_type, _TOLERANCES['default'])
+    tolerance = np.array([tol.get('chest', 5), tol.get('waist', 5), tol.get('hip', 5)], dtype=float)
+    weights = np.array([0.4, 0.3, 0.3])
+    # Shared between calls, so guard against in-place modification
+    tolerance.setflags(write=False)
+    weights.setflags(write=False)
+    return tolerance, weights
 
 class SizeRecommendationEngine:
+    # Body measurements and the size chart entries they are compared against
+    _KEYS_BODY = ('chest_circumference', 'waist_circumference', 'hip_circumference')
+    _KEYS_PROD = ('chest', 'waist', 'hip')
+    
     def __init__(self):
         self.body_keypoints = {
             'nose': 0, 'left_eye': 1, 'right_eye': 2,
@@ -18,19 +98,38 @@ class SizeRecommendationEngine:
             'left_knee': 13, 'right_knee': 14,
             'left_ankle': 15, 'right_ankle': 16
         }
+
+        # Landmark pairs whose midpoints fill the last three rows of the
+        # landmark array (ankles, hips, shoulders), addressed as rows -3, -2, -1
+        kp = self.body_keypoints
+        self._midpoint_pairs = np.array([
+            [kp['left_ankle'], kp['right_ankle']],
+            [kp['left_hip'], kp['right_hip']],
+            [kp['left_shoulder'], kp['right_shoulder']]
+        ])
+
+        # Endpoints of the distances measured per frame: shoulder width,
+        # height, torso length, upper arm, forearm, hip width
+        self._idx_a = np.array([
+            kp['left_shoulder'], kp['nose'], -1,
+            kp['left_shoulder'], kp['left_elbow'], kp['left_hip']
+        ])
+        self._idx_b = np.array([
+            kp['right_shoulder'], -3, -2,
+            kp['left_elbow'], kp['left_wrist'], kp['right_hip']
+        ])
+
+        # Pre-trained models are loaded lazily via the size_model/fit_model properties
         
-        # Load pre-trained models
-        self.load_models()
-        
-    def load_models(self):
-        """Load ML models for size prediction"""
-        try:
-            self.size_model = tf.keras.models.load_model('models/size_predictor.h5')
-            self.fit_model = tf.keras.models.load_model('models/fit_analyzer.h5')
-        except:
-            print("Models not found, using rule-based system")
-            self.size_model = None
-            self.fit_model = None
+    @property
+    def size_model(self):
+        """ONNX Runtime session for size prediction, or None if unavailable"""
+        return _get_session(_SIZE_MODEL_PATH)
+    
+    @property
+    def fit_model(self):
+        """ONNX Runtime session for fit analysis, or None if unavailable"""
+        return _get_session(_FIT_MODEL_PATH)
     
     def calculate_body_measurements(self, 
                                   pose_landmarks: List[Dict], 
@@ -48,48 +147,37 @@ class SizeRecommendationEngine:
             Dictionary of body measurements in cm
         """
         
-        # Convert normalized landmarks to pixel coordinates
-        landmarks_px = []
-        for landmark in pose_landmarks:
-            x = landmark['x'] * image_dimensions[0]
-            y = landmark['y'] * image_dimensions[1]
-            z = landmark.get('z', 0) * 100  # Scale Z coordinate
-            landmarks_px.append([x, y, z])
+        # Every keypoint must index a real landmark, not the spare midpoint rows
+        required = max(self.body_keypoints.values()) + 1
+        if len(pose_landmarks) < required:
+            raise ValueError(
+                f"Expected at least {required} pose landmarks, got {len(pose_landmarks)}"
+            )
         
-        landmarks_px = np.array(landmarks_px)
+        # Convert normalized landmarks to pixel coordinates, leaving three
+        # spare rows at the end for the ankle, hip and shoulder midpoints
+        width, height = image_dimensions[0], image_dimensions[1]
+        landmarks_px = np.empty((len(pose_landmarks) + 3, 3), dtype=np.float32)
+        for i, landmark in enumerate(pose_landmarks):
+            landmarks_px[i, 0] = landmark['x'] * width
+            landmarks_px[i, 1] = landmark['y'] * height
+            landmarks_px[i, 2] = landmark.get('z', 0) * 100  # Scale Z coordinate
+        
+        midpoints = landmarks_px[-3:]
+        np.add(landmarks_px[self._midpoint_pairs[:, 0]], landmarks_px[self._midpoint_pairs[:, 1]], out=midpoints)
+        midpoints *= 0.5
         
         # Calculate key measurements
         measurements = {}
         
-        # Shoulder width
-        left_shoulder = landmarks_px[self.body_keypoints['left_shoulder']]
-        right_shoulder = landmarks_px[self.body_keypoints['right_shoulder']]
-        shoulder_width_px = distance.euclidean(left_shoulder[:2], right_shoulder[:2])
-        
-        # Height estimation (from head to feet)
-        nose = landmarks_px[self.body_keypoints['nose']]
-        left_ankle = landmarks_px[self.body_keypoints['left_ankle']]
-        right_ankle = landmarks_px[self.body_keypoints['right_ankle']]
-        ankle_midpoint = (left_ankle + right_ankle) / 2
-        height_px = distance.euclidean(nose[:2], ankle_midpoint[:2])
-        
-        # Torso length
-        left_hip = landmarks_px[self.body_keypoints['left_hip']]
-        right_hip = landmarks_px[self.body_keypoints['right_hip']]
-        hip_midpoint = (left_hip + right_hip) / 2
-        shoulder_midpoint = (left_shoulder + right_shoulder) / 2
-        torso_length_px = distance.euclidean(shoulder_midpoint[:2], hip_midpoint[:2])
-        
-        # Arm length
-        left_wrist = landmarks_px[self.body_keypoints['left_wrist']]
-        arm_length_px = (
-            distance.euclidean(left_shoulder[:2], landmarks_px[self.body_keypoints['left_elbow']][:2]) +
-            distance.euclidean(landmarks_px[self.body_keypoints['left_elbow']][:2], left_wrist[:2])
-        )
-        
-        # Hip width
-        hip_width_px = distance.euclidean(left_hip[:2], right_hip[:2])
-        
+        # Measure every landmark pair in the image plane with a single batched norm
+        diffs = landmarks_px[self._idx_a, :2] - landmarks_px[self._idx_b, :2]
+        distances = np.linalg.norm(diffs, axis=1).tolist()
+
+        (shoulder_width_px, height_px, torso_length_px,
+         upper_arm_px, forearm_px, hip_width_px) = distances
+        arm_length_px = upper_arm_px + forearm_px
+
         # Convert pixels to real-world measurements
         # Assume average human height for calibration
         average_height_cm = 170
@@ -108,8 +196,9 @@ class SizeRecommendationEngine:
         measurements['inseam'] = (measurements['height'] - measurements['torso_length']) * 0.45
         
         # Add confidence scores based on landmark visibility
-        visibility_scores = [landmark.get('visibility', 1.0) for landmark in pose_landmarks]
-        measurements['confidence'] = np.mean(visibility_scores)
+        measurements['confidence'] = (
+            sum(landmark.get('visibility', 1.0) for landmark in pose_landmarks) / len(pose_landmarks)
+        )
         
         return measurements
     
@@ -134,93 +223,103 @@ class SizeRecommendationEngine:
         else:
             return self._rule_based_size_recommendation(body_measurements, product_measurements, product_type)
     
+    def _ml_size_recommendation(self, 
+                               body_measurements: Dict[str, float],
+                               product_measurements: Dict[str, Dict[str, float]],
+                               product_type: str) -> Dict:
+        """ML size recommendation: refine chest/waist/hip with the size model, then match the size chart"""
+        
+        if any(k not in body_measurements for k in _MODEL_FEATURES):
+            print("Size model input incomplete, using rule-based system")
+            return self._rule_based_size_recommendation(body_measurements, product_measurements, product_type)
+        
+        session = self.size_model
+        features = np.array([[body_measurements[k] for k in _MODEL_FEATURES]], dtype=np.float32)
+        try:
+            input_name = session.get_inputs()[0].name
+            predicted = np.asarray(session.run(None, {input_name: features})[0], dtype=float).reshape(-1)
+        except Exception as e:
+            print(f"Size model inference failed ({e}), using rule-based system")
+            return self._rule_based_size_recommendation(body_measurements, product_measurements, product_type)
+        
+        # Expect exactly chest, waist and hip circumference in cm
+        low, high = _MODEL_OUTPUT_RANGE_CM
+        if (predicted.shape != (len(self._KEYS_BODY),) or not np.all(np.isfinite(predicted))
+                or np.any(predicted < low) or np.any(predicted > high)):
+            print(f"Unexpected size model output {predicted.tolist()}, using rule-based system")
+            return self._rule_based_size_recommendation(body_measurements, product_measurements, product_type)
+        
+        refined = dict(body_measurements)
+        for key, value in zip(self._KEYS_BODY, predicted.tolist()):
+            refined[key] = value
+        
+        return self._rule_based_size_recommendation(refined, product_measurements, product_type)
+    
     def _rule_based_size_recommendation(self, 
                                        body_measurements: Dict[str, float],
                                        product_measurements: Dict[str, Dict[str, float]],
                                        product_type: str) -> Dict:
         """Rule-based size recommendation system"""
         
-        recommendations = []
-        
-        # Define tolerance for different product types
-        tolerances = {
-            'shirt': {'chest': 5, 'waist': 8, 'length': 3},
-            'pants': {'waist': 3, 'hip': 5, 'inseam': 2},
-            'dress': {'chest': 4, 'waist': 6, 'hip': 6},
-            'jacket': {'chest': 6, 'shoulder': 2, 'length': 4},
-            'default': {'chest': 5, 'waist': 5, 'hip': 5}
-        }
-        
-        product_tolerance = tolerances.get(product_type, tolerances['default'])
-        
-        for size, size_measurements in product_measurements.items():
-            fit_scores = {}
-            total_score = 0
-            total_weight = 0
-            
-            # Compare chest/bust
-            if 'chest' in size_measurements and 'chest_circumference' in body_measurements:
-                chest_diff = abs(body_measurements['chest_circumference'] - size_measurements['chest'])
-                chest_score = max(0, 100 - (chest_diff / product_tolerance.get('chest', 5)) * 50)
-                fit_scores['chest'] = {
-                    'score': chest_score,
-                    'difference': chest_diff,
-                    'fit': self._get_fit_description(chest_diff, product_tolerance.get('chest', 5))
+        size_names, sizes_arr = self._size_chart_array(product_measurements)
+        
+        if not size_names:
+            return {
+                'recommended_size': 'M',
+                'fit_score': 0,
+                'confidence': 0,
+                'fit_details': {},
+                'alternative_sizes': [],
+                'measurement_quality': self._assess_measurement_quality(body_measurements)
+            }
+        
+        tolerance, fit_weights = _tol_vec(product_type)
+        
+        # Score chest, waist and hip for every size at once; measurements
+        # missing from either side are NaN and drop out of the weighting
+        body = np.array([body_measurements.get(k, np.nan) for k in self._KEYS_BODY], dtype=float)
+        diffs = np.abs(sizes_arr - body)
+        valid = ~np.isnan(diffs)
+        scores = np.maximum(0, 100 - (diffs / tolerance) * 50)
+        weights = valid * fit_weights
+        total_weight = weights.sum(axis=1)
+        total_score = (np.where(valid, scores, 0) * weights).sum(axis=1)
+        overall = np.divide(total_score, total_weight,
+                            out=np.zeros_like(total_score), where=total_weight > 0)
+        
+        # Pick the three best sizes; ties keep size chart order
+        scores_list = overall.tolist()
+        top = heapq.nlargest(3, range(len(scores_list)), key=scores_list.__getitem__)
+        best = top[0]
+        best_score = scores_list[best]
+        
+        # Build fit details for the recommended size only
+        fit_scores = {}
+        for j, key in enumerate(self._KEYS_PROD):
+            if valid[best, j]:
+                fit_scores[key] = {
+                    'score': float(scores[best, j]),
+                    'difference': float(diffs[best, j]),
+                    'fit': self._get_fit_description(diffs[best, j], tolerance[j])
                 }
-                total_score += chest_score * 0.4
-                total_weight += 0.4
-            
-            # Compare waist
-            if 'waist' in size_measurements and 'waist_circumference' in body_measurements:
-                waist_diff = abs(body_measurements['waist_circumference'] - size_measurements['waist'])
-                waist_score = max(0, 100 - (waist_diff / product_tolerance.get('waist', 5)) * 50)
-                fit_scores['waist'] = {
-                    'score': waist_score,
-                    'difference': waist_diff,
-                    'fit': self._get_fit_description(waist_diff, product_tolerance.get('waist', 5))
-                }
-                total_score += waist_score * 0.3
-                total_weight += 0.3
-            
-            # Compare hip
-            if 'hip' in size_measurements and 'hip_circumference' in body_measurements:
-                hip_diff = abs(body_measurements['hip_circumference'] - size_measurements['hip'])
-                hip_score = max(0, 100 - (hip_diff / product_tolerance.get('hip', 5)) * 50)
-                fit_scores['hip'] = {
-                    'score': hip_score,
-                    'difference': hip_diff,
-                    'fit': self._get_fit_description(hip_diff, product_tolerance.get('hip', 5))
-                }
-                total_score += hip_score * 0.3
-                total_weight += 0.3
-            
-            # Calculate overall fit score
-            overall_score = total_score / total_weight if total_weight > 0 else 0
-            
-            recommendations.append({
-                'size': size,
-                'overall_score': overall_score,
-                'fit_scores': fit_scores,
-                'confidence': body_measurements.get('confidence', 0.8) * (overall_score / 100)
-            })
-        
-        # Sort by overall score
-        recommendations.sort(key=lambda x: x['overall_score'], reverse=True)
-        
-        # Prepare final recommendation
-        best_size = recommendations[0] if recommendations else None
-        alternative_sizes = [r for r in recommendations[1:] if r['overall_score'] > 70]
         
         return {
-            'recommended_size': best_size['size'] if best_size else 'M',
-            'fit_score': best_size['overall_score'] if best_size else 0,
-            'confidence': best_size['confidence'] if best_size else 0,
-            'fit_details': best_size['fit_scores'] if best_size else {},
-            'alternative_sizes': [{'size': r['size'], 'score': r['overall_score']} 
-                                for r in alternative_sizes[:2]],
+            'recommended_size': size_names[best],
+            'fit_score': best_score,
+            'confidence': body_measurements.get('confidence', 0.8) * (best_score / 100),
+            'fit_details': fit_scores,
+            'alternative_sizes': [{'size': size_names[i], 'score': scores_list[i]}
+                                for i in top[1:] if scores_list[i] > 70],
             'measurement_quality': self._assess_measurement_quality(body_measurements)
         }
     
+    def _size_chart_array(self, product_measurements: Dict[str, Dict[str, float]]) -> Tuple[List[str], np.ndarray]:
+        """Convert a size chart into size names and a (sizes, 3) chest/waist/hip array"""
+        size_names = list(product_measurements)
+        sizes_arr = np.array([[m.get(k, np.nan) for k in self._KEYS_PROD]
+                              for m in product_measurements.values()], dtype=float)
+        return size_names, sizes_arr
+    
     def _get_fit_description(self, difference: float, tolerance: float) -> str:
         """Get fit description based on measurement difference"""
         if difference < tolerance * 0.5:
@@ -262,27 +361,22 @@ class SizeRecommendationEngine:
         size_measurements = product_data['measurements'][selected_size]
         material_properties = self._estimate_material_properties(product_data.get('materials', []))
         
-        fit_analysis = {
-            'overall_fit': 'good',
-            'problem_areas': [],
-            'stretch_areas': [],
-            'comfort_score': 85,
-            'movement_restriction': 'minimal',
-            'visual_adjustments': {}
-        }
+        problem_areas = []
+        visual_adjustments = {}
+        stretch_areas = []
         
         # Analyze chest/bust fit
         if 'chest' in size_measurements:
             chest_diff = body_measurements.get('chest_circumference', 0) - size_measurements['chest']
             if chest_diff > 5:
-                fit_analysis['problem_areas'].append({
+                problem_areas.append({
                     'area': 'chest',
                     'issue': 'too_tight',
                     'severity': min(chest_diff / 10, 1.0)
                 })
-                fit_analysis['visual_adjustments']['chest_stretch'] = chest_diff / 100
+                visual_adjustments['chest_stretch'] = chest_diff / 100
             elif chest_diff < -10:
-                fit_analysis['problem_areas'].append({
+                problem_areas.append({
                     'area': 'chest',
                     'issue': 'too_loose',
                     'severity': min(abs(chest_diff) / 15, 1.0)
@@ -290,42 +384,46 @@ class SizeRecommendationEngine:
         
         # Calculate stretch based on material
         if material_properties['stretch_factor'] > 0:
-            fit_analysis['stretch_areas'] = self._calculate_stretch_areas(
+            stretch_areas = self._calculate_stretch_areas(
                 body_measurements, size_measurements, material_properties
             )
         
         # Comfort score calculation
-        comfort_factors = []
-        for area in fit_analysis['problem_areas']:
-            comfort_factors.append(1 - area['severity'] * 0.3)
+        comfort_score = 85
+        if problem_areas:
+            comfort_factors = [1 - area['severity'] * 0.3 for area in problem_areas]
+            comfort_score = int(sum(comfort_factors) / len(comfort_factors) * 100)
         
-        if comfort_factors:
-            fit_analysis['comfort_score'] = int(np.mean(comfort_factors) * 100)
-        
-        return fit_analysis
+        return {
+            'overall_fit': 'good',
+            'problem_areas': problem_areas,
+            'stretch_areas': stretch_areas,
+            'comfort_score': comfort_score,
+            'movement_restriction': 'minimal',
+            'visual_adjustments': visual_adjustments
+        }
     
     def _estimate_material_properties(self, materials: List[str]) -> Dict:
         """Estimate material properties from material description"""
         
-        properties = {
-            'stretch_factor': 0,
-            'breathability': 0.5,
-            'thickness': 0.5,
-            'drape': 0.5
-        }
+        if not materials:
+            return _DEFAULT_MATERIAL_PROPERTIES
+        
+        properties = dict(_DEFAULT_MATERIAL_PROPERTIES)
         
-        material_text = ' '.join(materials).lower()
+        # Collect known material keywords in a single scan
+        tokens = {token.lower() for token in _MATERIAL_RE.findall(' '.join(materials))}
         
         # Stretch factor
-        if any(word in material_text for word in ['spandex', 'elastane', 'lycra', 'stretch']):
+        if tokens & _STRETCH_MATERIALS:
             properties['stretch_factor'] = 0.15
-        elif 'cotton' in material_text and 'stretch' in material_text:
+        elif {'cotton', 'stretch'} <= tokens:
             properties['stretch_factor'] = 0.08
         
         # Breathability
-        if any(word in material_text for word in ['cotton', 'linen', 'bamboo']):
+        if tokens & _BREATHABLE_MATERIALS:
             properties['breathability'] = 0.8
-        elif any(word in material_text for word in ['polyester', 'nylon']):
+        elif tokens & _SYNTHETIC_MATERIALS:
             properties['breathability'] = 0.4
         
         return properties
@@ -339,30 +437,27 @@ class SizeRecommendationEngine:
         stretch_areas = []
         stretch_factor = material_properties['stretch_factor']
         
-        # Check each measurement point
-        measurement_mapping = {
-            'chest_circumference': 'chest',
-            'waist_circumference': 'waist',
-            'hip_circumference': 'hip'
-        }
-        
-        for body_key, product_key in measurement_mapping.items():
-            if body_key in body_measurements and product_key in size_measurements:
-                diff = body_measurements[body_key] - size_measurements[product_key]
-                
-                if diff > 0 and diff <= size_measurements[product_key] * stretch_factor:
-                    stretch_areas.append({
-                        'area': product_key,
-                        'stretch_percentage': (diff / size_measurements[product_key]) * 100,
-                        'within_limits': True
-                    })
-                elif diff > size_measurements[product_key] * stretch_factor:
-                    stretch_areas.append({
-                        'area': product_key,
-                        'stretch_percentage': stretch_factor * 100,
-                        'within_limits': False,
-                        'excess': diff - (size_measurements[product_key] * stretch_factor)
-                    })
+        # Compare chest, waist and hip at once; missing measurements are NaN
+        body = np.array([body_measurements.get(k, np.nan) for k in self._KEYS_BODY], dtype=float)
+        product = np.array([size_measurements.get(k, np.nan) for k in self._KEYS_PROD], dtype=float)
+        diffs = body - product
+        limits = product * stretch_factor
+        within = diffs <= limits
+        
+        for i in np.flatnonzero((diffs > 0) & np.isfinite(diffs)):
+            if within[i]:
+                stretch_areas.append({
+                    'area': self._KEYS_PROD[i],
+                    'stretch_percentage': float(diffs[i] / product[i] * 100),
+                    'within_limits': True
+                })
+            else:
+                stretch_areas.append({
+                    'area': self._KEYS_PROD[i],
+                    'stretch_percentage': stretch_factor * 100,
+                    'within_limits': False,
+                    'excess': float(diffs[i] - limits[i])
+                })
         
         return stretch_areas
 
@@ -441,28 +536,32 @@ class FurniturePlacementEngine:
             'depth': furniture_dimensions.get('depth', 36) * 0.0254
         }
         
-        # Find suitable positions
-        for space in room_analysis['available_spaces']:
-            if self._can_fit_furniture(space, furniture_size):
-                placement = {
+        # Score every candidate space at once, then build placements for the best three
+        spaces = room_analysis['available_spaces']
+        fits = np.zeros(0, dtype=bool)
+        if spaces:
+            space_sizes = np.array([space.get('size', [0, 0]) for space in spaces], dtype=float)
+            fits = self._can_fit_furniture(space_sizes, furniture_size)
+            confidence = self._calculate_placement_confidence(space_sizes, furniture_size, furniture_type)
+            
+            # Sort fitting spaces by confidence
+            candidates = np.flatnonzero(fits)
+            top = candidates[np.argsort(-confidence[candidates], kind='stable')[:3]]
+            
+            for i in top:
+                space = spaces[i]
+                placements.append({
                     'position': space['center'],
                     'rotation': self._calculate_optimal_rotation(
                         space, furniture_size, furniture_type, room_analysis['walls']
                     ),
                     'scale': 1.0,
-                    'confidence': self._calculate_placement_confidence(
-                        space, furniture_size, furniture_type
-                    ),
+                    'confidence': float(confidence[i]),
                     'clearance': self._calculate_clearance(space, furniture_size),
                     'lighting_quality': self._assess_position_lighting(
                         space['center'], room_analysis['lighting']
                     )
-                }
-                
-                placements.append(placement)
-        
-        # Sort by confidence
-        placements.sort(key=lambda x: x['confidence'], reverse=True)
+                })
         
         # Add placement warnings
         warnings = []
@@ -472,8 +571,8 @@ class FurniturePlacementEngine:
             warnings.append("Limited walking space around furniture")
         
         return {
-            'recommended_placements': placements[:3],  # Top 3 positions
-            'furniture_fits': len(placements) > 0,
+            'recommended_placements': placements,  # Top 3 positions
+            'furniture_fits': bool(fits.any()),
             'warnings': warnings,
             'room_compatibility_score': self._calculate_room_compatibility(
                 room_analysis, furniture_size, furniture_type
@@ -492,14 +591,13 @@ class FurniturePlacementEngine:
     def _calculate_floor_area(self, floor_plane: Dict) -> float:
         """Calculate available floor area"""
         if 'boundary' in floor_plane:
-            # Calculate polygon area
-            points = floor_plane['boundary']
-            area = 0
-            for i in range(len(points)):
-                j = (i + 1) % len(points)
-                area += points[i][0] * points[j][2]
-                area -= points[j][0] * points[i][2]
-            return abs(area) / 2
+            # Calculate polygon area (shoelace formula on the x/z plane)
+            points = np.asarray(floor_plane['boundary'], dtype=np.float64)
+            if len(points) == 0:
+                return 0
+            x, z = points[:, 0], points[:, 2]
+            area = np.dot(x, np.roll(z, -1)) - np.dot(z, np.roll(x, -1))
+            return abs(float(area)) / 2
         return 0
     
     def _find_available_spaces(self, 
@@ -525,17 +623,15 @@ class FurniturePlacementEngine:
         
         return available_spaces
     
-    def _can_fit_furniture(self, space: Dict, furniture_size: Dict) -> bool:
-        """Check if furniture can fit in the space"""
-        space_size = space.get('size', [0, 0])
+    def _can_fit_furniture(self, space_sizes: np.ndarray, furniture_size: Dict) -> np.ndarray:
+        """Check which (N, 2) space sizes the furniture can fit in"""
+        width, depth = furniture_size['width'], furniture_size['depth']
         
         # Check both orientations
-        fits_normal = (furniture_size['width'] <= space_size[0] and 
-                      furniture_size['depth'] <= space_size[1])
-        fits_rotated = (furniture_size['depth'] <= space_size[0] and 
-                       furniture_size['width'] <= space_size[1])
+        fits_normal = (width <= space_sizes[:, 0]) & (depth <= space_sizes[:, 1])
+        fits_rotated = (depth <= space_sizes[:, 0]) & (width <= space_sizes[:, 1])
         
-        return fits_normal or fits_rotated
+        return fits_normal | fits_rotated
     
     def _calculate_optimal_rotation(self,
                                    space: Dict,
@@ -563,38 +659,44 @@ class FurniturePlacementEngine:
         return 0  # Default no rotation
     
     def _calculate_placement_confidence(self,
-                                       space: Dict,
+                                       space_sizes: np.ndarray,
                                        furniture_size: Dict,
-                                       furniture_type: str) -> float:
-        """Calculate confidence score for placement"""
-        
-        confidence = 1.0
+                                       furniture_type: str) -> np.ndarray:
+        """Calculate confidence scores for placement in each (N, 2) space size"""
         
         # Size fit factor
-        space_size = space.get('size', [0, 0])
-        size_ratio = (furniture_size['width'] * furniture_size['depth']) / \
-                    (space_size[0] * space_size[1])
+        furniture_area = furniture_size['width'] * furniture_size['depth']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            size_ratio = furniture_area / space_sizes.prod(axis=1)
         
-        if size_ratio > 0.8:
-            confidence *= 0.7  # Too tight
-        elif size_ratio < 0.2:
-            confidence *= 0.8  # Too much empty space
+        confidence = np.where(size_ratio > 0.8, 0.7,  # Too tight
+                              np.where(size_ratio < 0.2, 0.8, 1.0))  # Too much empty space
         
         # Furniture type specific factors
         if furniture_type == 'sofa':
             # Sofas need more clearance
-            if space_size[0] < furniture_size['width'] + 1.0:
-                confidence *= 0.6
+            confidence *= np.where(space_sizes[:, 0] < furniture_size['width'] + 1.0, 0.6, 1.0)
         
         return confidence
     
     def _estimate_lighting(self, depth_map: np.ndarray) -> Dict:
         """Estimate room lighting from image"""
-        # Simplified lighting estimation
-        brightness = np.mean(depth_map)
+        # Simplified lighting estimation on a strided subsample; a brightness
+        # bucket does not need every pixel
+        depth_map = np.asarray(depth_map)
+        sub = depth_map[::8, ::8]
+        brightness = float(sub.mean()) if sub.size else 0.0
+        
+        # Integer maps (uint8 frames, or int64 once decoded from JSON) are
+        # 8-bit and scaled by 255; float depth maps by their maximum
+        if np.issubdtype(depth_map.dtype, np.integer):
+            intensity = brightness / 255.0
+        else:
+            max_value = float(depth_map.max()) if depth_map.size else 0.0
+            intensity = brightness / max_value if max_value > 0 else 0.0
         
         return {
-            'intensity': brightness / 255.0,
+            'intensity': intensity,
             'direction': [0, -1, 0],  # Top-down
             'color_temperature': 5000  # Kelvin
         }
@@ -679,10 +781,16 @@ class FurniturePlacementEngine:
         return 0.0
 
 
+@lru_cache(maxsize=1)
+def _get_engine() -> SizeRecommendationEngine:
+    """Shared size recommendation engine"""
+    return SizeRecommendationEngine()
+
+
 # Export main functions
 def process_size_recommendation(body_landmarks, image_dimensions, product_data):
     """Main entry point for size recommendation"""
-    engine = SizeRecommendationEngine()
+    engine = _get_engine()
     
     # Calculate body measurements
     measurements = engine.calculate_body_measurements(
@@ -710,9 +818,15 @@ def process_size_recommendation(body_landmarks, image_dimensions, product_data):
     return recommendation
 
 
+@lru_cache(maxsize=1)
+def _furniture_engine() -> FurniturePlacementEngine:
+    """Shared furniture placement engine"""
+    return FurniturePlacementEngine()
+
+
 def process_furniture_placement(room_data, furniture_data):
     """Main entry point for furniture placement"""
-    engine = FurniturePlacementEngine()
+    engine = _furniture_engine()
     
     # Analyze room
     room_analysis = engine.analyze_room_space(